@@ -0,0 +1,6 @@
+#!/bin/bash
+
+
+
+echo "Creazione indici e ricostruzione dei massimali per le classifiche"
+python -m pl_backend.leaderboard
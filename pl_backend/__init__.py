@@ -0,0 +1,5 @@
+from time import perf_counter
+
+
+
+IMPORT_START = perf_counter() # Inizio dell'import del package, usato da main per misurare il tempo di import
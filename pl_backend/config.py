@@ -1,4 +1,7 @@
 from pydantic_settings import BaseSettings
+from typing import List, Optional
+import os
+import tempfile
 
 
 
@@ -13,14 +16,28 @@ class Settings(BaseSettings):
     algorithm: str
     access_token_expire_minutes: int
 
+    # Profiling delle query (solo debug). Le email degli admin ricevono lo scope "admin" nel token al login
+    profiling_enabled: bool = False
+    profiles_dir: str = os.path.join(tempfile.gettempdir(), "pl_backend_profiles") # Nell'immagine Docker l'app gira come utente non privilegiato, che non può scrivere in /app
+    profiles_max: int = 200 # Numero massimo di profili conservati, i più vecchi vengono cancellati
+    admin_emails: List[str] = []
 
-settings = Settings()
+    leaderboard_cache_seconds: int = 60
 
-DB_USERNAME = settings.postgres_user
-DB_PASSWORD = settings.postgres_password
-DB_HOST = settings.postgres_host
-DB_NAME = settings.postgres_db
 
-SECRET_KEY = settings.secret_key
-ALGORITHM = settings.algorithm
-ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
\ No newline at end of file
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    # Settings viene istanziato alla prima chiamata e non all'import del modulo, così importare il package non richiede le variabili d'ambiente
+    global _settings
+
+    if _settings is None:
+        _settings = Settings()
+
+    return _settings
+
+def set_settings(settings: Settings) -> None:
+    # Usato da create_app per passare delle impostazioni esplicite (es. nei test) al posto di quelle lette dall'ambiente
+    global _settings
+    _settings = settings
@@ -1,9 +1,9 @@
-from .models import SessionLocal
+from .models import get_session_local
 
 
 # Dependency
 def get_db():
-    db = SessionLocal()
+    db = get_session_local()()
 
     try:
         yield db
@@ -0,0 +1,295 @@
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+from time import monotonic
+from threading import Lock
+from typing import Any, Callable, Iterable, List, Optional
+
+from .models.lift import Lift, SQUAT, BENCH, DEADLIFT
+from .models.lift_record import LiftRecord
+from .models.daily_metrics import DailyMetrics
+from .models.user import User
+from .config import get_settings
+
+
+
+TOTAL = "total" # Somma dei massimali di squat, panca e stacco: esiste solo se l'utente li ha registrati tutti e tre
+
+WEIGHT_CLASSES = [59, 66, 74, 83, 93, 105, 120] # Categorie di peso IPF, in kg. Chi supera l'ultima rientra nella "120+"
+
+
+def get_weight_class(body_weight: Optional[float]) -> Optional[str]:
+    if body_weight is None:
+        return None
+
+    for limit in WEIGHT_CLASSES:
+        if body_weight <= limit:
+            return str(limit)
+
+    return f"{WEIGHT_CLASSES[-1]}+"
+
+
+class TTLCache:
+    # Piccola cache in memoria, per processo, con scadenza e numero massimo di chiavi (le meno recenti vengono scartate). Il ttl è una funzione, così i Settings vengono letti solo al primo utilizzo
+    def __init__(self, ttl: Callable[[], float], maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock() # Gli endpoint sincroni girano nel threadpool, quindi più richieste accedono alla cache in parallelo
+
+    def get_or_set(self, key: Any, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is not None and monotonic() - item[0] < self.ttl():
+                self._data.move_to_end(key)
+                return item[1]
+
+        loaded_at = monotonic() # Preso prima della query: il valore riflette il DB almeno da questo istante
+        value = loader() # Fuori dal lock: la query a DB non deve bloccare le altre richieste
+        self.set(key, value, loaded_at)
+
+        return value
+
+    def set(self, key: Any, value: Any, loaded_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (loaded_at if loaded_at is not None else monotonic(), value)
+            self._data.move_to_end(key)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, key: Any, updater: Callable[[Any], Any], since: float) -> None:
+        # Copy-on-write: updater restituisce un nuovo valore che sostituisce quello in cache, così chi sta già leggendo il vecchio continua a vedere dati coerenti.
+        # Un valore caricato da `since` in poi potrebbe già contenere la modifica: non sappiamo se applicarla, quindi lo scartiamo e verrà ricaricato alla prossima lettura
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                return
+
+            if item[0] >= since:
+                del self._data[key]
+            else:
+                self._data[key] = (item[0], updater(item[1]))
+
+    def discard(self, predicate: Callable[[Any], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+
+# Per ogni (alzata, categoria) teniamo la lista ordinata dei massimali: rank e percentile di un peso si trovano con una ricerca binaria, in tempo logaritmico
+_boards = TTLCache(lambda: get_settings().leaderboard_cache_seconds)
+_pages = TTLCache(lambda: get_settings().leaderboard_cache_seconds)
+
+BOARD_CHANGES_KEY = "leaderboard_changes" # Chiave in session.info con le modifiche ai massimali da applicare alla cache dopo il commit
+COMMIT_STARTED_KEY = "leaderboard_commit_started" # Chiave in session.info con l'istante in cui è iniziato il commit
+
+
+def _ranking_query(db: Session, lift_type: str, weight_class: Optional[str]):
+    query = db.query(LiftRecord).filter(LiftRecord.lift_type == lift_type)
+
+    if weight_class is not None:
+        query = query.filter(LiftRecord.weight_class == weight_class)
+
+    return query
+
+def _contains(board: List[float], weight: float) -> bool:
+    i = bisect_left(board, weight)
+    return i < len(board) and board[i] == weight
+
+def get_board(db: Session, lift_type: str, weight_class: Optional[str], required: Iterable[float] = ()) -> List[float]:
+    # required sono i massimali appena letti da DB che la classifica deve contenere. Se la cache non li ha (la scrittura è passata da un altro worker), è vecchia e la ricarichiamo
+    def load() -> List[float]:
+        query = _ranking_query(db, lift_type, weight_class).with_entities(LiftRecord.best_weight)
+        return [weight for weight, in query.order_by(LiftRecord.best_weight).all()]
+
+    board = _boards.get_or_set((lift_type, weight_class), load)
+
+    if not all(_contains(board, weight) for weight in required):
+        loaded_at = monotonic()
+        board = load()
+        _boards.set((lift_type, weight_class), board, loaded_at)
+
+    return board
+
+def get_rank(board: List[float], weight: float) -> int:
+    # Rank "da gara": a parità di peso si condivide la posizione, quindi il rank è 1 + il numero di pesi strettamente maggiori
+    return len(board) - bisect_right(board, weight) + 1
+
+def get_percentile(board: List[float], weight: float) -> float:
+    # Percentuale di lifter con un massimale minore o uguale
+    if not board:
+        return 0.0 # Nessun lifter in classifica
+
+    return 100 * bisect_right(board, weight) / len(board)
+
+def get_top(db: Session, lift_type: str, weight_class: Optional[str], limit: int, offset: int) -> List[dict]:
+    def load() -> List[dict]:
+        records = (
+            _ranking_query(db, lift_type, weight_class)
+            .order_by(LiftRecord.best_weight.desc(), LiftRecord.user_id)
+            .offset(offset)
+            .limit(limit) # Grazie agli indici ix_lift_records_overall_ranking e ix_lift_records_class_ranking Postgres legge solo le righe della pagina
+            .all()
+        )
+        board = get_board(db, lift_type, weight_class, required=[record.best_weight for record in records])
+
+        return [
+            {
+                "rank": get_rank(board, record.best_weight),
+                "user_id": record.user_id,
+                "best_weight": record.best_weight,
+                "weight_class": record.weight_class,
+            }
+            for record in records
+        ]
+
+    return _pages.get_or_set((lift_type, weight_class, limit, offset), load)
+
+def refresh_user_records(db: Session, user_id: int) -> None:
+    # Ricalcola i massimali di un solo utente dopo una scrittura sulle sue alzate o metriche. Legge solo le righe dell'utente grazie agli indici su lifts e daily_metrics.
+    # Non fa commit: va chiamata dopo db.flush(), così il ricalcolo fa parte della stessa transazione della scrittura. Le classifiche in cache vengono aggiornate solo dopo il commit
+    # Lock sull'utente: due scritture concorrenti dello stesso utente ricalcolano una dopo l'altra, e la seconda vede i dati della prima.
+    # FOR NO KEY UPDATE (key_share=True) e non FOR UPDATE: l'insert dell'alzata tiene già un KEY SHARE sull'utente per la foreign key, e FOR UPDATE andrebbe in deadlock
+    db.execute(select(User.id).where(User.id == user_id).with_for_update(key_share=True))
+
+    bests = dict(
+        db.query(Lift.lift_type, func.max(Lift.weight))
+        .filter(Lift.user_id == user_id)
+        .group_by(Lift.lift_type)
+        .all()
+    )
+
+    if all(lift_type in bests for lift_type in (SQUAT, BENCH, DEADLIFT)):
+        bests[TOTAL] = bests[SQUAT] + bests[BENCH] + bests[DEADLIFT]
+
+    body_weight = (
+        db.query(DailyMetrics.body_weight)
+        .filter(DailyMetrics.user_id == user_id, DailyMetrics.body_weight.is_not(None))
+        .order_by(DailyMetrics.register_dt.desc(), DailyMetrics.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    weight_class = get_weight_class(body_weight)
+
+    old_records = {
+        lift_type: (best_weight, old_class)
+        for lift_type, best_weight, old_class in db.query(LiftRecord.lift_type, LiftRecord.best_weight, LiftRecord.weight_class).filter(LiftRecord.user_id == user_id).all()
+    }
+    new_records = {lift_type: (best_weight, weight_class) for lift_type, best_weight in bests.items()}
+    db.info.setdefault(BOARD_CHANGES_KEY, []).extend(
+        (lift_type, old_records.get(lift_type), new_records.get(lift_type))
+        for lift_type in old_records.keys() | new_records.keys()
+        if old_records.get(lift_type) != new_records.get(lift_type)
+    )
+
+    if bests:
+        upsert = insert(LiftRecord).values([
+            {
+                "user_id": user_id,
+                "lift_type": lift_type,
+                "best_weight": best_weight,
+                "weight_class": weight_class,
+                "update_dt": date.today(),
+            }
+            for lift_type, best_weight in bests.items()
+        ])
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=[LiftRecord.user_id, LiftRecord.lift_type],
+            set_={
+                "best_weight": upsert.excluded.best_weight,
+                "weight_class": upsert.excluded.weight_class,
+                "update_dt": upsert.excluded.update_dt,
+            },
+        ))
+
+    # Cancelliamo solo i massimali delle alzate che l'utente non ha più (es. ha eliminato tutti i suoi squat)
+    db.query(LiftRecord).filter(
+        LiftRecord.user_id == user_id,
+        LiftRecord.lift_type.not_in(list(bests)),
+    ).delete(synchronize_session=False)
+
+def _board_keys(lift_type: str, record: tuple) -> List[tuple]:
+    # Un massimale compare nella classifica assoluta e in quella della sua categoria
+    keys = [(lift_type, None)]
+
+    if record[1] is not None:
+        keys.append((lift_type, record[1]))
+
+    return keys
+
+def _without_weight(board: List[float], weight: float) -> List[float]:
+    i = bisect_left(board, weight)
+
+    if i < len(board) and board[i] == weight:
+        return board[:i] + board[i + 1:]
+
+    return board
+
+def _with_weight(board: List[float], weight: float) -> List[float]:
+    i = bisect_right(board, weight)
+    return board[:i] + [weight] + board[i:]
+
+@event.listens_for(Session, "before_commit")
+def _mark_commit_started(session: Session) -> None:
+    if BOARD_CHANGES_KEY in session.info:
+        session.info[COMMIT_STARTED_KEY] = monotonic()
+
+@event.listens_for(Session, "after_commit")
+def _apply_board_changes(session: Session) -> None:
+    # Le classifiche in cache di questo processo vengono aggiornate (rimozione del vecchio massimale e inserimento ordinato del nuovo) senza ricaricarle da DB. Quelle degli altri worker si aggiornano alla scadenza della cache.
+    # Solo le classifiche caricate prima dell'inizio del commit sono sicuramente senza la modifica; quelle caricate dopo vengono scartate da update()
+    changes = session.info.pop(BOARD_CHANGES_KEY, [])
+    since = session.info.pop(COMMIT_STARTED_KEY, monotonic())
+
+    for lift_type, old_record, new_record in changes:
+        if old_record is not None:
+            for key in _board_keys(lift_type, old_record):
+                _boards.update(key, lambda board: _without_weight(board, old_record[0]), since)
+        if new_record is not None:
+            for key in _board_keys(lift_type, new_record):
+                _boards.update(key, lambda board: _with_weight(board, new_record[0]), since)
+
+    # Le pagine contengono i rank di tutti, quindi quelle delle alzate modificate vanno ricaricate (leggono solo le righe della pagina)
+    changed_lifts = {lift_type for lift_type, _, _ in changes}
+    if changed_lifts:
+        _pages.discard(lambda key: key[0] in changed_lifts)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_board_changes(session: Session) -> None:
+    session.info.pop(BOARD_CHANGES_KEY, None)
+    session.info.pop(COMMIT_STARTED_KEY, None)
+
+def create_indexes(engine) -> None:
+    # create_all salta le tabelle già esistenti e con loro i loro indici: sui DB esistenti gli indici usati da refresh_user_records e dalle classifiche vanno creati qui.
+    # Senza ix_lifts_user_id_lift_type e ix_daily_metrics_user_id_register_dt ogni scrittura farebbe una scansione completa di lifts e daily_metrics
+    for table in (Lift.__table__, DailyMetrics.__table__, LiftRecord.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def rebuild_records(db: Session) -> None:
+    # Ricostruzione completa, da lanciare una volta per popolare lift_records con i dati già presenti
+    user_ids = [user_id for user_id, in db.query(Lift.user_id).distinct().all()]
+
+    for user_id in user_ids:
+        refresh_user_records(db, user_id)
+        db.commit()
+
+
+if __name__ == "__main__":
+    # Da lanciare con `python -m pl_backend.leaderboard` (cli/rebuild_leaderboards.sh): è la migrazione una tantum delle classifiche
+    from .models import Base, get_engine, get_session_local
+
+    Base.metadata.create_all(bind=get_engine())
+    create_indexes(get_engine())
+
+    db = get_session_local()()
+    try:
+        rebuild_records(db)
+    finally:
+        db.close()
@@ -1,35 +1,107 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import Optional
+import logging
 
-from .models import Base
-from .models import engine
+from . import IMPORT_START
+from .config import Settings, get_settings, set_settings
+from .models import Base, get_engine, dispose_engine
 from .routers import (
     lifts,
     users,
     auth,
     daily_metrics,
+    profiles,
+    leaderboards,
 )
 
 
 
+IMPORT_TIME = perf_counter() - IMPORT_START # Tempo di import dell'applicazione (FastAPI, SQLAlchemy, router e modelli)
 
+logger = logging.getLogger("uvicorn.error") # Logger di uvicorn, così i tempi finiscono nello stesso output del server
 
-Base.metadata.create_all(bind=engine)
+UNTIMED_PATHS = {"/health", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"} # Readiness probe e documentazione: non aprono sessioni e non caricano bcrypt
 
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    # Accetto chiamate da tutte queste origin
-    allow_origins=[
-        "http://localhost:5173",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+class FirstRequestTimer:
+    # Middleware ASGI puro che misura la durata della prima vera richiesta del worker, quella che paga la prima sessione, il caricamento di bcrypt e gli altri costi di prima chiamata (l'engine invece viene già creato nel lifespan).
+    # Sono esclusi la readiness probe, la documentazione e i preflight CORS (OPTIONS, a cui risponde direttamente CORSMiddleware): arrivano spesso per primi e non costruiscono niente. Dopo la misura resta solo un controllo su un booleano
+    def __init__(self, app, timings: dict):
+        self.app = app
+        self.timings = timings
+        self.done = False
+
+    async def __call__(self, scope, receive, send):
+        if self.done or scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in UNTIMED_PATHS:
+            return await self.app(scope, receive, send)
+
+        self.done = True # Impostato prima dell'await, così con richieste concorrenti ne misuriamo una sola
+        start = perf_counter()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.timings["first_request_ms"] = (perf_counter() - start) * 1000
+            logger.info("First request (%s %s): %.1f ms", scope["method"], scope["path"], self.timings["first_request_ms"])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: i Settings vengono validati e le tabelle create qui, non all'import. Così se manca una variabile d'ambiente il worker fallisce subito all'avvio
+    start = perf_counter()
+    get_settings()
+    Base.metadata.create_all(bind=get_engine())
+    app.state.timings["startup_ms"] = (perf_counter() - start) * 1000
+
+    logger.info("Import: %.1f ms, startup: %.1f ms", app.state.timings["import_ms"], app.state.timings["startup_ms"])
+
+    yield
+
+    # Shutdown: chiudiamo le connessioni del pool
+    dispose_engine()
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    # Application factory. Da avviare con `uvicorn --factory pl_backend.main:create_app`. Se settings è None vengono letti dalle variabili d'ambiente allo startup
+    if settings is not None:
+        set_settings(settings)
+        dispose_engine() # Un eventuale engine creato con i Settings precedenti non è più valido
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.timings = {
+        "import_ms": IMPORT_TIME * 1000,
+        "startup_ms": None,
+        "first_request_ms": None,
+    }
+
+    app.add_middleware(
+        CORSMiddleware,
+        # Accetto chiamate da tutte queste origin
+        allow_origins=[
+            "http://localhost:5173",
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(FirstRequestTimer, timings=app.state.timings)
+
+    @app.get("/health", tags=["Health"])
+    def health() -> dict:
+        # Usato dall'autoscaler come readiness probe, restituisce anche i tempi di avvio del worker
+        return {
+            "status": "ok",
+            "timings": app.state.timings,
+        }
+
+    app.include_router(users.router)
+    app.include_router(lifts.router)
+    app.include_router(auth.router)
+    app.include_router(daily_metrics.router)
+    app.include_router(profiles.router)
+    app.include_router(leaderboards.router)
 
-app.include_router(users.router)
-app.include_router(lifts.router)
-app.include_router(auth.router)
-app.include_router(daily_metrics.router)
\ No newline at end of file
+    return app
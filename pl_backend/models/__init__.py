@@ -1,19 +1,44 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import Optional
 
-from ..config import (
-    DB_USERNAME,
-    DB_HOST,
-    DB_NAME,
-    DB_PASSWORD,
-)
+from ..config import get_settings
 
 
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+Base = declarative_base()
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine (e quindi il pool di connessioni) e sessionmaker vengono creati al primo utilizzo (nell'app, il create_all del lifespan), non all'import
+_engine: Optional[Engine] = None
+_session_local: Optional[sessionmaker] = None
 
-Base = declarative_base()
\ No newline at end of file
+
+def get_engine() -> Engine:
+    global _engine, _session_local
+
+    if _engine is None:
+        settings = get_settings()
+        database_url = f"postgresql://{settings.postgres_user}:{settings.postgres_password}@{settings.postgres_host}/{settings.postgres_db}"
+
+        _engine = create_engine(database_url)
+        _session_local = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+
+    return _engine
+
+def get_session_local() -> sessionmaker:
+    if _session_local is None:
+        get_engine()
+
+    return _session_local
+
+def dispose_engine() -> None:
+    # Chiude le connessioni del pool allo shutdown. L'engine verrà ricreato alla prossima get_engine()
+    global _engine, _session_local
+
+    if _engine is not None:
+        _engine.dispose()
+
+    _engine = None
+    _session_local = None
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Date, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Date, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import date
 
@@ -8,6 +8,9 @@ from . import Base
 
 class DailyMetrics(Base):
     __tablename__ = "daily_metrics"
+    __table_args__ = (
+        Index("ix_daily_metrics_user_id_register_dt", "user_id", "register_dt"), # Usato per recuperare l'ultimo peso corporeo di un utente
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -1,13 +1,20 @@
-from sqlalchemy import Column, Integer, Date, ForeignKey, Float, String
+from sqlalchemy import Column, Integer, Date, ForeignKey, Float, String, Index
 from sqlalchemy.orm import relationship
 from datetime import date
 
 from . import Base
 
 
+SQUAT = "squat"
+BENCH = "bench"
+DEADLIFT = "deadlift"
+
 
 class Lift(Base): # Obbligatorio che la classe estenda Base
     __tablename__ = "lifts" # Questo il nome effettivo della tabella nel DB
+    __table_args__ = (
+        Index("ix_lifts_user_id_lift_type", "user_id", "lift_type"), # Usato per ricalcolare i massimali di un singolo utente
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False) # Con l'opzione ondelete indichiamo che se il parent viene cancellato, tutti i figli vengono cancellati (quindi se uno user viene cancellato, tutti i suoi pesi vengono cancellati)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import date
+
+from . import Base
+
+
+
+class LiftRecord(Base):
+    # Tabella dei massimali (best-of) per utente e alzata, con la categoria di peso (il peso corporeo non viene salvato: è un dato personale e alle classifiche basta la categoria), aggiornata ad ogni scrittura su lifts e daily_metrics. Le classifiche leggono solo da qui, senza scansionare tutta la tabella lifts
+    __tablename__ = "lift_records"
+    __table_args__ = (
+        UniqueConstraint("user_id", "lift_type"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    lift_type = Column(String, nullable=False) # squat, bench, deadlift oppure total
+    best_weight = Column(Float, nullable=False)
+    weight_class = Column(String) # Dall'ultimo peso corporeo registrato in daily_metrics. None se l'utente non l'ha mai registrato
+    update_dt = Column(Date, default=date.today)
+
+    user = relationship("User")
+
+
+# Indici B-tree per le pagine delle classifiche: hanno lo stesso ordinamento della query (best_weight DESC, user_id), così Postgres legge solo le righe della pagina senza ordinare tutta l'alzata
+Index("ix_lift_records_overall_ranking", LiftRecord.lift_type, LiftRecord.best_weight.desc(), LiftRecord.user_id)
+Index("ix_lift_records_class_ranking", LiftRecord.lift_type, LiftRecord.weight_class, LiftRecord.best_weight.desc(), LiftRecord.user_id)
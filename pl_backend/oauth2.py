@@ -1,65 +1,88 @@
-from fastapi import Depends, status, HTTPException
+from fastapi import Depends, Request, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from copy import deepcopy
 from datetime import datetime, timedelta, UTC
 from pydantic import BaseModel
+from typing import List
+from time import perf_counter
 
 from .models.user import User
 from .dependencies import get_db
-from .config import (
-    SECRET_KEY,
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    ALGORITHM,
-)
+from .config import get_settings
 
 
 
 
 
+ADMIN_SCOPE = "admin"
+
 oaut2_scheme = OAuth2PasswordBearer("login") # Il parametro deve essere l'endpoint dell'url che genererà il token. E' quello che abbiamo inserito nel login.
 
 
 class TokenModel(BaseModel):
     id: int
+    scopes: List[str] = []
 
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
 
 def create_access_token(data: dict) -> str:
+    settings = get_settings()
     to_encode = deepcopy(data) # Copiamo i dati passati in input solo per pulizia, e non sovrascriverli
 
     # Impostiamo la expiration date del token. E' importante mettere il fuso UTC
-    expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(UTC) + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire}) # Questa è una chiave che va creata così
 
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, ALGORITHM) # Codifichiamo il token, anche se NON è CRYPTATO, tutti lo possono vedere, però solo noi abbiamo la chiave con cui è stato codificato
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, settings.algorithm) # Codifichiamo il token, anche se NON è CRYPTATO, tutti lo possono vedere, però solo noi abbiamo la chiave con cui è stato codificato
 
     return encoded_jwt
 
 def verify_token(token: str, credentials_excpetion: Exception) -> TokenModel:
+    settings = get_settings()
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, ALGORITHM) # Facciamo la decodifica del token
+        payload = jwt.decode(token, settings.secret_key, settings.algorithm) # Facciamo la decodifica del token
         id = payload.get("user_id")
 
         if id is None:
             raise credentials_excpetion
 
-        token_data = TokenModel(id=id) # Questo serve solo per utilizzare il modello pydantic per validare i dati che ci sono stati passati all'interno del token. Il dato che verifichiamo ovviamente dipende dai dati che abbiamo deciso di inserire nel token
+        token_data = TokenModel(id=id, scopes=payload.get("scopes", [])) # Questo serve solo per utilizzare il modello pydantic per validare i dati che ci sono stati passati all'interno del token. Il dato che verifichiamo ovviamente dipende dai dati che abbiamo deciso di inserire nel token
     except JWTError:
         raise credentials_excpetion
 
     return token_data
 
 def get_current_user(
+    request: Request,
     token: str = Depends(oaut2_scheme),
     db: Session = Depends(get_db)
 ) -> User: # Quello che fa oaut2_scheme (che è una funzione, perché è un'istanza della classe OAuth2PasswordBearer, ma è anche un callable) è andare nell'header della richiesta e cercare l'header Authorization, nel quale ci deve essere il token scritto così: `Bearer <your_token>`, e restituisce il token come stringa. Quindi noi non dobbiamo fare nulla, nessun controllo se il token esiste o è nel formato corretto, fa tutto lui. L'importante è che nell'header della richiesta ci venga passato correttamente
     credentials_exceptions = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"}) # L'header l'ho trovato sulla documentazione di FastAPI
 
+    auth_start = perf_counter()
     token_data = verify_token(token, credentials_exceptions)
     user = db.query(User).filter(User.id == token_data.id).first() # Filtriamo l'utente corrente e lo restituiamo
+    request.state.auth_time = perf_counter() - auth_start # Tempo di autenticazione, letto dal profiler delle query
+
+    return user
+
+def check_admin(token: str) -> None:
+    credentials_exceptions = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+
+    token_data = verify_token(token, credentials_exceptions)
+
+    if ADMIN_SCOPE not in token_data.scopes:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin scope required")
+
+def get_current_admin(
+    token: str = Depends(oaut2_scheme),
+    current_user: User = Depends(get_current_user),
+) -> User:
+    check_admin(token) # Lo scope viene inserito nel token al login, quindi non serve andare a DB
 
-    return user
\ No newline at end of file
+    return current_user
\ No newline at end of file
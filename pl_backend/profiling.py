@@ -0,0 +1,169 @@
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Query, Session
+from pydantic import TypeAdapter
+from datetime import datetime, UTC
+from time import perf_counter
+from typing import Any, Optional
+from uuid import uuid4
+import json
+import logging
+import os
+
+from .dependencies import get_db
+from .oauth2 import oaut2_scheme, check_admin
+from .config import get_settings
+
+
+
+PROFILE_HEADER = "X-Profile" # Header che il client deve inviare, con valore "1", per richiedere il profiling
+PROFILE_ID_HEADER = "X-Profile-Id" # Header della response con l'id del profilo salvato
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class RequestProfiler:
+    # Raccoglie SQL, EXPLAIN, righe e tempi di ogni fase di una singola richiesta, e li salva come JSON in settings.profiles_dir
+    def __init__(self, request: Request, db: Session):
+        self.request = request
+        self.db = db
+        self.statements = []
+        self.stages = {}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiling_start", []).append(perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["profiling_start"].pop()
+
+        self.statements.append({
+            "sql": statement,
+            "parameters": parameters,
+            "executemany": executemany,
+            "rowcount": cursor.rowcount,
+            "time_ms": elapsed * 1000,
+        })
+
+    def _explain(self, conn) -> None:
+        # EXPLAIN ANALYZE esegue davvero la query, quindi lo facciamo solo sulle SELECT.
+        # Ogni EXPLAIN gira in un savepoint: se fallisce (es. permessi) salviamo l'errore nel profilo, la transazione della sessione resta valida e la response viene restituita comunque
+        for stmt in self.statements:
+            if stmt["executemany"] or not stmt["sql"].lstrip().upper().startswith("SELECT"):
+                continue
+
+            try:
+                with conn.begin_nested():
+                    result = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {stmt['sql']}", stmt["parameters"])
+                    stmt["explain"] = [row[0] for row in result]
+            except DBAPIError as e:
+                stmt["explain_error"] = str(e.orig)
+
+    def respond(self, query: Query, response_type: Any) -> Response:
+        # Sostituisce il `return query.all()` dell'endpoint: esegue la query, la valida e la codifica come farebbe FastAPI con il response_model, misurando ogni fase
+        auth_time = getattr(self.request.state, "auth_time", None)
+        if auth_time is not None:
+            self.stages["auth"] = auth_time * 1000
+
+        conn = self.db.connection() # Ascoltiamo gli eventi solo sulla connessione di questa sessione, non sull'engine, così le altre richieste non finiscono nel profilo
+        event.listen(conn, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(conn, "after_cursor_execute", self._after_cursor_execute)
+
+        try:
+            start = perf_counter()
+            results = query.all()
+            total = (perf_counter() - start) * 1000
+        finally:
+            event.remove(conn, "before_cursor_execute", self._before_cursor_execute)
+            event.remove(conn, "after_cursor_execute", self._after_cursor_execute)
+
+        # Il tempo passato sul cursore è quello del DB, il resto di query.all() è la costruzione degli oggetti ORM
+        sql_time = sum(stmt["time_ms"] for stmt in self.statements)
+        self.stages["query"] = sql_time
+        self.stages["orm_hydration"] = total - sql_time
+
+        adapter = TypeAdapter(response_type)
+
+        start = perf_counter()
+        validated = adapter.validate_python(results, from_attributes=True)
+        self.stages["pydantic_validation"] = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        content = adapter.dump_json(validated, by_alias=True)
+        self.stages["encoding"] = (perf_counter() - start) * 1000
+
+        self._explain(conn)
+        profile_id = self._save(len(results))
+        headers = {PROFILE_ID_HEADER: profile_id} if profile_id is not None else {}
+
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    def _save(self, rows: int) -> Optional[str]:
+        # Se il profilo non può essere scritto la richiesta non deve fallire: restituiamo la response normale, senza id del profilo
+        profile_id = uuid4().hex
+        profile = {
+            "id": profile_id,
+            "created_at": datetime.now(UTC).isoformat(),
+            "method": self.request.method,
+            "path": self.request.url.path,
+            "query_params": dict(self.request.query_params),
+            "rows": rows,
+            "stages_ms": self.stages,
+            "statements": self.statements,
+        }
+
+        settings = get_settings()
+
+        try:
+            os.makedirs(settings.profiles_dir, exist_ok=True)
+            with open(os.path.join(settings.profiles_dir, f"{profile_id}.json"), "w") as f:
+                json.dump(profile, f, indent=2, default=str) # default=str per date e Enum nei parametri delle query
+
+            _prune_profiles(settings.profiles_dir, settings.profiles_max)
+        except OSError:
+            logger.exception("Could not save query profile in %s", settings.profiles_dir)
+            return None
+
+        return profile_id
+
+
+def _prune_profiles(profiles_dir: str, profiles_max: int) -> None:
+    # Teniamo solo gli ultimi profiles_max profili, cancellando i più vecchi
+    paths = [entry.path for entry in os.scandir(profiles_dir) if entry.name.endswith(".json")]
+
+    if len(paths) <= profiles_max:
+        return
+
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - profiles_max]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass # Già cancellato da un'altra richiesta
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    path = os.path.join(get_settings().profiles_dir, f"{profile_id}.json")
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+# Dependency
+def get_profiler(
+    request: Request,
+    token: str = Depends(oaut2_scheme),
+    db: Session = Depends(get_db),
+) -> Optional[RequestProfiler]:
+    # Restituisce None (nessun costo aggiuntivo) a meno che il profiling sia abilitato nei Settings e la richiesta abbia l'header di profiling con valore "1"
+    if not get_settings().profiling_enabled or request.headers.get(PROFILE_HEADER) != "1":
+        return None
+
+    try:
+        check_admin(token)
+    except HTTPException:
+        return None # Il profiling è un canale di debug: a chi non è admin restituiamo la response normale invece di rifiutare la richiesta
+
+    return RequestProfiler(request, db)
@@ -5,7 +5,8 @@ from sqlalchemy.orm import Session
 from ..utils import verify_pwd
 from ..dependencies import get_db
 from ..models.user import User
-from ..oauth2 import create_access_token, TokenResponse
+from ..oauth2 import create_access_token, TokenResponse, ADMIN_SCOPE
+from ..config import get_settings
 
 
 
@@ -31,7 +32,12 @@ def login_user(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid credentials") # Anche qui non diamo indicazione sul fatto che è la password ad essere sbagliata
 
     # Generazione JWT token
-    access_token = create_access_token({"user_id": user.id}) # Siamo noi a decidere quali sono i dati da passare all'interno del token. In questo caso inviamo unicamente l'id, ma avremmo potuto mandare qualsiasi altra cosa
+    token_data = {"user_id": user.id}
+
+    if user.email in get_settings().admin_emails:
+        token_data["scopes"] = [ADMIN_SCOPE] # Lo scope admin abilita, tra le altre cose, il profiling delle query
+
+    access_token = create_access_token(token_data) # Siamo noi a decidere quali sono i dati da passare all'interno del token. In questo caso inviamo l'id ed eventualmente gli scope, ma avremmo potuto mandare qualsiasi altra cosa
 
     return {
         "access_token": access_token,
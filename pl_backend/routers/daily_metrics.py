@@ -10,7 +10,9 @@ from .users import UserResponse
 from ..models.daily_metrics import DailyMetrics
 from ..models.user import User
 from ..oauth2 import get_current_user
+from ..profiling import RequestProfiler, get_profiler
 from ..utils import check_user
+from ..leaderboard import refresh_user_records
 
 
 
@@ -65,6 +67,7 @@ def get_user_metrics(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    profiler: Optional[RequestProfiler] = Depends(get_profiler),
     # Query parameters
     start_dt: date = None,
     end_dt: date = None,
@@ -111,6 +114,9 @@ def get_user_metrics(
     if sleeping_quality is not None:
         metrics_query = metrics_query.filter(DailyMetrics.sleeping_quality == sleeping_quality)
 
+    if profiler is not None:
+        return profiler.respond(metrics_query, List[MetricsResponse])
+
     daily_metrics = metrics_query.all()
 
     return daily_metrics
@@ -130,6 +136,11 @@ def create_user_metrics(
     )
 
     db.add(new_metrics)
+
+    if new_metrics.body_weight is not None:
+        db.flush()
+        refresh_user_records(db, user_id) # Il peso corporeo determina la categoria nelle classifiche, le altre metriche non le toccano
+
     db.commit()
     db.refresh(new_metrics)
 
@@ -149,6 +160,11 @@ def delete_user_metrics(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metric not found")
 
     db.delete(metrics)
+
+    if metrics.body_weight is not None:
+        db.flush()
+        refresh_user_records(db, metrics.user_id)
+
     db.commit()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -168,7 +184,13 @@ def update_user_metrics(
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metric not found")
 
+    old_body_weight = metrics.body_weight # Letto prima dell'update, che con synchronize_session="fetch" aggiorna anche l'oggetto
     metrics_query.update(metrics_data.model_dump(), synchronize_session="fetch")
+
+    if metrics_data.body_weight != old_body_weight:
+        db.flush()
+        refresh_user_records(db, metrics.user_id)
+
     db.commit()
 
     return metrics_query.first()
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import List, Optional
+from enum import Enum
+
+from ..dependencies import get_db
+from ..models.lift import SQUAT, BENCH, DEADLIFT
+from ..models.lift_record import LiftRecord
+from ..models.user import User
+from ..oauth2 import get_current_user
+from ..leaderboard import TOTAL, get_board, get_rank, get_percentile, get_top
+
+
+
+router = APIRouter(
+    prefix="/leaderboards",
+    tags=["Leaderboards"],
+)
+
+class LeaderboardLift(str, Enum):
+    squat = SQUAT
+    bench = BENCH
+    deadlift = DEADLIFT
+    total = TOTAL
+
+class WeightClass(str, Enum):
+    # Deve rispecchiare WEIGHT_CLASSES in leaderboard.py
+    kg_59 = "59"
+    kg_66 = "66"
+    kg_74 = "74"
+    kg_83 = "83"
+    kg_93 = "93"
+    kg_105 = "105"
+    kg_120 = "120"
+    kg_120_plus = "120+"
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    best_weight: float
+    weight_class: Optional[str]
+
+class RankModel(BaseModel):
+    rank: int
+    percentile: float
+    lifters: int
+
+class MyRankResponse(BaseModel):
+    best_weight: float
+    weight_class: Optional[str]
+    overall: RankModel
+    class_rank: Optional[RankModel] # None se l'utente non ha una categoria di peso
+
+
+def build_rank(board: List[float], weight: float) -> RankModel:
+    return RankModel(rank=get_rank(board, weight), percentile=get_percentile(board, weight), lifters=len(board))
+
+
+@router.get("/{lift_type}", response_model=List[LeaderboardEntry])
+def get_leaderboard(
+    lift_type: LeaderboardLift,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    # Query parameters
+    weight_class: Optional[WeightClass] = None, # Se non specificata, classifica assoluta
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+) -> List[dict]:
+    return get_top(db, lift_type.value, weight_class.value if weight_class is not None else None, limit, offset)
+
+@router.get("/{lift_type}/me", response_model=MyRankResponse)
+def get_my_rank(
+    lift_type: LeaderboardLift,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> MyRankResponse:
+    record = db.query(LiftRecord).filter(LiftRecord.user_id == current_user.id, LiftRecord.lift_type == lift_type.value).first()
+
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No record for this lift")
+
+    # Passando il massimale appena letto, la classifica in cache viene ricaricata se non lo contiene: così non può essere vuota e il rank non supera mai il numero di lifter
+    overall = build_rank(get_board(db, lift_type.value, None, required=[record.best_weight]), record.best_weight)
+    class_rank = None
+
+    if record.weight_class is not None:
+        class_rank = build_rank(get_board(db, lift_type.value, record.weight_class, required=[record.best_weight]), record.best_weight)
+
+    return MyRankResponse(
+        best_weight=record.best_weight,
+        weight_class=record.weight_class,
+        overall=overall,
+        class_rank=class_rank,
+    )
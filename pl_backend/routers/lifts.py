@@ -5,17 +5,14 @@ from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from enum import Enum
 
-from ..models.lift import Lift
+from ..models.lift import Lift, SQUAT, BENCH, DEADLIFT
 from ..models.user import User
 from ..dependencies import get_db
 from ..oauth2 import get_current_user
+from ..profiling import RequestProfiler, get_profiler
 from ..routers.users import UserResponse
 from ..utils import check_user
-
-
-SQUAT = "squat"
-BENCH = "bench"
-DEADLIFT = "deadlift"
+from ..leaderboard import refresh_user_records
 
 
 # Visto che l'applicazione è strutturata in più moduli python, in ogni router, anziché creare una nuova app FastAPI, creiamo un router dell'app, che poi andremo ad includere nel nostro main
@@ -91,6 +88,7 @@ def get_user_lifts(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    profiler: Optional[RequestProfiler] = Depends(get_profiler), # None a meno che un admin non richieda il profiling con l'header X-Profile: 1
     # === Query parameters ===
     lift_type: Optional[LiftType] = None, # Con Optional[LiftType] diciamo a pydantic (che viene chiamato in automatico da FastAPI) che il parametro è opzionale (valore di default None), ma se viene passato deve utilizzare la classe LiftType per identificare i valori ammessi.
     # Inoltre, questo è un QUERY PARAMETER, identificato automaticamente da FastAPI, e il nome del parametro all'interno dell'URL deve essere esattamente quello del parametro
@@ -121,6 +119,9 @@ def get_user_lifts(
     if max_rpe is not None:
         lift_query = lift_query.filter(Lift.rpe <= max_rpe)
 
+    if profiler is not None:
+        return profiler.respond(lift_query, List[LiftResponse])
+
     lifts = lift_query.all()
 
     return lifts
@@ -140,6 +141,8 @@ def create_user_lift(
     )
 
     db.add(new_lift) # Aggiungiamo l'utente. Non dobbiamo specificare la tabella, perché SQLAlchemy lo capisce in base all'oggetto creato
+    db.flush() # Mandiamo l'insert al DB senza committare, così il ricalcolo dei massimali la vede
+    refresh_user_records(db, user_id) # Aggiorniamo i massimali usati dalle classifiche, nella stessa transazione dell'alzata
     db.commit() # Ogni volta che si fa una modifica al db questa deve essere committata
     db.refresh(new_lift) # Nelle richieste post si restituisce sempre l'oggetto creato (ovviamente togliendo eventuali dati sensibili). Una volta che l'abbiamo creato a DB, facendo un refresh otteniamo il nuovo oggetto creato e possiamo restituirlo
 
@@ -159,6 +162,8 @@ def delete_user_lift(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lift not found")
 
     db.delete(lift)
+    db.flush()
+    refresh_user_records(db, lift.user_id)
     db.commit()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -180,6 +185,8 @@ def update_user_lift(
 
     # Update del peso
     lift_query.update(lift_infos.model_dump(), synchronize_session="fetch")
+    db.flush()
+    refresh_user_records(db, lift.user_id)
     db.commit()
 
     return lift_query.first() # Restituiamo il peso aggiornato
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+
+from ..models.user import User
+from ..oauth2 import get_current_admin
+from ..profiling import load_profile
+
+
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["Profiles"],
+)
+
+
+@router.get("/{profile_id}")
+def get_profile(
+    profile_id: str = Path(pattern="^[0-9a-f]{32}$"), # L'id è un uuid4 in esadecimale: col pattern evitiamo che venga usato per leggere file fuori dalla cartella dei profili
+    current_admin: User = Depends(get_current_admin),
+) -> dict:
+    profile = load_profile(profile_id)
+
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+
+    return profile
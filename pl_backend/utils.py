@@ -1,18 +1,21 @@
 from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from functools import lru_cache
 
 from .models.user import User
 
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+@lru_cache
+def get_pwd_context() -> CryptContext:
+    # Creato al primo utilizzo, così chi importa il modulo non paga il caricamento di bcrypt
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def hash_pwd(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_pwd(tentative_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(tentative_password, hashed_password) # La tentative password viene hashata in automatico, non dobbiamo farlo noi
+    return get_pwd_context().verify(tentative_password, hashed_password) # La tentative password viene hashata in automatico, non dobbiamo farlo noi
 
 def check_user(user_id: int, current_user: User) -> None:
     if user_id != current_user.id: